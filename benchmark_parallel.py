@@ -0,0 +1,60 @@
+import argparse
+import time
+import numpy as np
+from components import ParallelComponent
+from core import ParallelUpdater
+
+class Body(ParallelComponent):
+
+    fields = {"position": 2, "velocity": 2}
+
+    @staticmethod
+    def update_batch(arrays, delta_time):
+        position = arrays["position"]
+        velocity = arrays["velocity"]
+        step = delta_time / 16
+
+        for i in range(16):
+            distance = np.sqrt(position[:, 0] ** 2 + position[:, 1] ** 2) + 1
+            velocity[:, 0] -= position[:, 0] / distance ** 3 * step
+            velocity[:, 1] -= position[:, 1] / distance ** 3 * step
+            position += velocity * step
+
+def run(count, frames, workers, min_batch_size):
+    updater = ParallelUpdater(workers, min_batch_size)
+    random = np.random.default_rng(0)
+
+    for i in range(count):
+        body = Body(None)
+        body.initialize()
+        body._position = tuple(random.uniform(-100, 100, 2).tolist())
+        body._velocity = tuple(random.uniform(-1, 1, 2).tolist())
+        updater.register(body)
+
+    updater.update(1 / 60)
+
+    start = time.perf_counter()
+    for i in range(frames):
+        updater.update(1 / 60)
+    duration = (time.perf_counter() - start) / frames
+
+    updater.close()
+    return duration
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--count", type=int, default=200000)
+    parser.add_argument("--frames", type=int, default=30)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    args = parser.parse_args()
+
+    baseline = run(args.count, args.frames, 1, args.count)
+    print(f"{'workers':>8} {'ms/frame':>10} {'speedup':>8}")
+    print(f"{'serial':>8} {baseline * 1000:>10.2f} {1:>8.2f}")
+
+    for workers in args.workers:
+        duration = run(args.count, args.frames, workers, 1)
+        print(f"{workers:>8} {duration * 1000:>10.2f} {baseline / duration:>8.2f}")
+
+if __name__ == "__main__":
+    main()
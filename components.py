@@ -1,13 +1,25 @@
 from abc import ABC
+import array
+import numpy as np
+import zlib
 from util import *
 from exceptions import *
     
 class Component(ABC):
     
+    is_parallel = False
+    random_seed = None
+    
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        ComponentRegistry.register(cls)
+    
     def __init__(self, entity):
         self.is_active = True
         self._entity = entity
         self.has_started = False
+        self._is_sleeping = False
+        self._wake_time = None
         
     def initialize(self):
         pass
@@ -24,6 +36,59 @@ class Component(ABC):
     def get_entity(self):
         return self._entity
     
+    def create_random(self):
+        if Component.random_seed is None:
+            return np.random.default_rng()
+        
+        key = f"{self._entity.get_name()}/{self.__class__.__name__}"
+        return np.random.default_rng([Component.random_seed, zlib.crc32(key.encode())])
+    
+    def sleep(self):
+        self._entity._scene._sleep_component(self, None)
+    
+    def sleep_for(self, seconds):
+        self._entity._scene._sleep_component(self, seconds)
+    
+    def wake(self):
+        self._entity._scene._wake_component(self)
+    
+    def is_sleeping(self):
+        return self._is_sleeping
+    
+class ParallelComponent(Component):
+    
+    is_parallel = True
+    fields = {}
+    
+    def initialize(self):
+        self._store = None
+        self._store_index = None
+        
+        for name, size in type(self).fields.items():
+            self.__dict__["_" + name] = (0.0,) * size if size > 1 else 0.0
+    
+    def update(self, scene_manager, frame_metrics, input, camera):
+        arrays = {name: np.array([self.__dict__["_" + name]], dtype=np.float64) for name in type(self).fields}
+        type(self).update_batch(arrays, frame_metrics.get_delta_time())
+        
+        for name, size in type(self).fields.items():
+            self.__dict__["_" + name] = tuple(arrays[name][0].tolist()) if size > 1 else float(arrays[name][0])
+    
+    @staticmethod
+    def update_batch(arrays, delta_time):
+        pass
+    
+    def get_field(self, name):
+        if self._store is not None:
+            return self._store.get_value(name, self._store_index)
+        return self.__dict__["_" + name]
+    
+    def set_field(self, name, value):
+        if self._store is not None:
+            self._store.set_value(name, self._store_index, value)
+        else:
+            self.__dict__["_" + name] = value
+    
 class Transform(Component):
     
     def initialize(self):
@@ -35,6 +100,7 @@ class Transform(Component):
         self._prev_position = self._position
     
     def update(self, scene_manager, delta_time, input, camera):
+        moved = self._position != self._prev_position
         self._prev_position = self._position
         
         if self._entity.get_parent() is not None:
@@ -44,7 +110,9 @@ class Transform(Component):
             
             if parent_pos != parent_prev_pos:
                 delta_pos = (parent_pos[0] - parent_prev_pos[0], parent_pos[1] - parent_prev_pos[1])
-                self.move_to_direction(delta_pos[0], delta_pos[1])            
+                self.move_to_direction(delta_pos)            
+        elif not moved:
+            self.sleep()
     
     def get_position(self):
         return self._position
@@ -54,9 +122,15 @@ class Transform(Component):
     
     def move_to(self, new_position):
         self._position = new_position    
+        
+        if self._is_sleeping:
+            self.wake()
     
     def move_to_direction(self, direction):
         self._position = (self._position[0] + direction[0], self._position[1] + direction[1])
+        
+        if self._is_sleeping:
+            self.wake()
     
     def get_scale(self):
         return self._scale
@@ -113,6 +187,318 @@ class SpriteRenderer(Component):
         self._flip_y = bool
         self._sprite.image = pygame.transform.flip(self._sprite.image, self._flip_x, self._flip_y)
         
+class Tilemap(Component):
+    
+    EMPTY = -1
+    
+    def initialize(self):
+        self._path = ""
+        self._layer = ""
+        self._tile_size = (16, 16)
+        self._chunk_size = 16
+        self._chunk_margin = 1
+        self._width = 0
+        self._height = 0
+        self._tiles = array.array("h")
+        self._added_to_buffer = False
+        self._tileset = None
+        self._tile_rects = None
+        self._chunks = {}
+        
+    def start(self):
+        self._tileset = pygame.image.load(self._path.path).convert_alpha()
+        self._tile_rects = []
+        self._chunks = {}
+        
+        tile_width, tile_height = self._tile_size
+        columns = self._tileset.get_width() // tile_width
+        rows = self._tileset.get_height() // tile_height
+        
+        for row in range(rows):
+            for column in range(columns):
+                self._tile_rects.append(pygame.Rect(column * tile_width, row * tile_height, tile_width, tile_height))
+        
+        if len(self._tiles) > 0:
+            self._check_index(min(self._tiles))
+            self._check_index(max(self._tiles))
+    
+    def draw(self, buffer):
+        if not self._added_to_buffer:
+            buffer.add_tilemap(self)
+            self._added_to_buffer = True
+    
+    def set_tileset(self, path, tile_size):
+        self._path = Path(path)
+        self._tile_size = tile_size
+        
+        if self.has_started:
+            self.start()
+    
+    def set_size(self, width, height):
+        self._width = width
+        self._height = height
+        self._tiles = array.array("h", [Tilemap.EMPTY]) * (width * height)
+        self._chunks = {}
+    
+    def get_size(self):
+        return (self._width, self._height)
+    
+    def get_tile_size(self):
+        return self._tile_size
+    
+    def set_chunk_size(self, chunk_size):
+        self._chunk_size = chunk_size
+        self._chunks = {}
+    
+    def set_chunk_margin(self, chunk_margin):
+        self._chunk_margin = chunk_margin
+    
+    def set_tile(self, x, y, index):
+        if x < 0 or y < 0 or x >= self._width or y >= self._height:
+            raise TileOutOfBoundsException()
+        
+        self._check_index(index)
+        self._tiles[y * self._width + x] = index
+        self._chunks.pop((x // self._chunk_size, y // self._chunk_size), None)
+    
+    def get_tile(self, x, y):
+        if x < 0 or y < 0 or x >= self._width or y >= self._height:
+            raise TileOutOfBoundsException()
+        
+        return self._tiles[y * self._width + x]
+    
+    def fill(self, index):
+        self._check_index(index)
+        self._tiles = array.array("h", [index]) * (self._width * self._height)
+        self._chunks = {}
+    
+    def set_layer(self, layer):
+        self._layer = layer
+    
+    def get_layer(self):
+        return self._layer
+    
+    def get_visible_chunks(self, camera_position, view_size):
+        origin = self._entity.transform.get_position()
+        chunk_width = self._chunk_size * self._tile_size[0]
+        chunk_height = self._chunk_size * self._tile_size[1]
+        chunks_x = -(-self._width // self._chunk_size)
+        chunks_y = -(-self._height // self._chunk_size)
+        
+        first_x = max(int((camera_position[0] - origin[0]) // chunk_width), 0)
+        first_y = max(int((camera_position[1] - origin[1]) // chunk_height), 0)
+        last_x = min(int((camera_position[0] + view_size[0] - origin[0]) // chunk_width), chunks_x - 1)
+        last_y = min(int((camera_position[1] + view_size[1] - origin[1]) // chunk_height), chunks_y - 1)
+        
+        margin = self._chunk_margin
+        for chunk in list(self._chunks):
+            if chunk[0] < first_x - margin or chunk[0] > last_x + margin or chunk[1] < first_y - margin or chunk[1] > last_y + margin:
+                del self._chunks[chunk]
+        
+        for chunk_y in range(first_y, last_y + 1):
+            for chunk_x in range(first_x, last_x + 1):
+                surface = self._chunks.get((chunk_x, chunk_y))
+                if surface is None:
+                    surface = self._render_chunk(chunk_x, chunk_y)
+                    self._chunks[(chunk_x, chunk_y)] = surface
+                yield surface, (origin[0] + chunk_x * chunk_width, origin[1] + chunk_y * chunk_height)
+    
+    def _check_index(self, index):
+        if index == Tilemap.EMPTY:
+            return
+        
+        if index < 0 or (self._tile_rects is not None and index >= len(self._tile_rects)):
+            raise UnknownTileException()
+    
+    def _render_chunk(self, chunk_x, chunk_y):
+        tile_width, tile_height = self._tile_size
+        surface = pygame.Surface((self._chunk_size * tile_width, self._chunk_size * tile_height), pygame.SRCALPHA)
+        
+        start_x = chunk_x * self._chunk_size
+        start_y = chunk_y * self._chunk_size
+        end_x = min(start_x + self._chunk_size, self._width)
+        end_y = min(start_y + self._chunk_size, self._height)
+        
+        blits = []
+        for y in range(start_y, end_y):
+            row = y * self._width
+            for x in range(start_x, end_x):
+                index = self._tiles[row + x]
+                if index != Tilemap.EMPTY:
+                    blits.append((self._tileset, ((x - start_x) * tile_width, (y - start_y) * tile_height), self._tile_rects[index]))
+        
+        surface.blits(blits, doreturn=False)
+        return surface
+        
+class ParticleEmitter(Component):
+    
+    def initialize(self):
+        self._layer = ""
+        self._max_particles = 1000
+        self._rate = 0
+        self._lifetime = (1.0, 1.0)
+        self._speed = (50.0, 100.0)
+        self._direction = 0.0
+        self._spread = 360.0
+        self._gravity = (0.0, 0.0)
+        self._start_color = Color.WHITE
+        self._end_color = Color.WHITE
+        self._color_steps = 16
+        self._size = 2
+        self._emitting = False
+        self._emit_progress = 0.0
+        self._pending = 0
+        self._added_to_buffer = False
+        self._count = 0
+        self._positions = None
+        self._velocities = None
+        self._ages = None
+        self._lifetimes = None
+        self._images = None
+        self._random = None
+    
+    def start(self):
+        self._positions = np.zeros((self._max_particles, 2))
+        self._velocities = np.zeros((self._max_particles, 2))
+        self._ages = np.zeros(self._max_particles)
+        self._lifetimes = np.ones(self._max_particles)
+        self._random = self.create_random()
+        self._count = 0
+        self._create_images()
+    
+    def update(self, scene_manager, frame_metrics, input, camera):
+        delta_time = frame_metrics.get_delta_time()
+        
+        if self._emitting:
+            self._emit_progress += self._rate * delta_time
+            spawn_count = int(self._emit_progress)
+            self._emit_progress -= spawn_count
+            self._pending += spawn_count
+        
+        if self._pending > 0:
+            self._spawn(self._pending)
+            self._pending = 0
+        
+        count = self._count
+        if count > 0:
+            self._ages[:count] += delta_time
+            alive = self._ages[:count] < self._lifetimes[:count]
+            
+            if not alive.all():
+                alive_count = int(alive.sum())
+                self._positions[:alive_count] = self._positions[:count][alive]
+                self._velocities[:alive_count] = self._velocities[:count][alive]
+                self._ages[:alive_count] = self._ages[:count][alive]
+                self._lifetimes[:alive_count] = self._lifetimes[:count][alive]
+                count = self._count = alive_count
+            
+            self._velocities[:count] += np.multiply(self._gravity, delta_time)
+            self._positions[:count] += self._velocities[:count] * delta_time
+        
+        if not self._emitting and self._count == 0:
+            self.sleep()
+    
+    def draw(self, buffer):
+        if not self._added_to_buffer:
+            buffer.add_particle_emitter(self)
+            self._added_to_buffer = True
+    
+    def get_blits(self, camera_position):
+        count = self._count
+        if count == 0:
+            return []
+        
+        steps = (self._ages[:count] / self._lifetimes[:count] * (self._color_steps - 1)).astype(int)
+        images = self._images[np.minimum(steps, self._color_steps - 1)]
+        positions = self._positions[:count] - camera_position - self._size / 2
+        return zip(images.tolist(), positions.tolist())
+    
+    def emit(self, count):
+        self._pending += count
+        
+        if self._is_sleeping:
+            self.wake()
+    
+    def set_emitting(self, bool):
+        self._emitting = bool
+        
+        if bool and self._is_sleeping:
+            self.wake()
+    
+    def is_emitting(self):
+        return self._emitting
+    
+    def get_particle_count(self):
+        return self._count
+    
+    def set_rate(self, rate):
+        self._rate = rate
+    
+    def set_lifetime(self, min_lifetime, max_lifetime):
+        self._lifetime = (min_lifetime, max_lifetime)
+    
+    def set_speed(self, min_speed, max_speed):
+        self._speed = (min_speed, max_speed)
+    
+    def set_direction(self, direction, spread):
+        self._direction = direction
+        self._spread = spread
+    
+    def set_gravity(self, gravity):
+        self._gravity = gravity
+    
+    def set_color(self, start_color, end_color):
+        self._start_color = start_color
+        self._end_color = end_color
+        
+        if self.has_started:
+            self._create_images()
+    
+    def set_size(self, size):
+        self._size = size
+        
+        if self.has_started:
+            self._create_images()
+    
+    def set_max_particles(self, max_particles):
+        self._max_particles = max_particles
+        
+        if self.has_started:
+            self.start()
+    
+    def set_layer(self, layer):
+        self._layer = layer
+    
+    def get_layer(self):
+        return self._layer
+    
+    def _spawn(self, count):
+        count = min(count, self._max_particles - self._count)
+        if count <= 0:
+            return
+        
+        start = self._count
+        end = start + count
+        angles = np.radians(self._direction + self._random.uniform(-self._spread / 2, self._spread / 2, count))
+        speeds = self._random.uniform(self._speed[0], self._speed[1], count)
+        
+        self._positions[start:end] = self._entity.transform.get_position()
+        self._velocities[start:end, 0] = np.cos(angles) * speeds
+        self._velocities[start:end, 1] = np.sin(angles) * speeds
+        self._ages[start:end] = 0
+        self._lifetimes[start:end] = self._random.uniform(self._lifetime[0], self._lifetime[1], count)
+        self._count = end
+    
+    def _create_images(self):
+        self._images = np.empty(self._color_steps, dtype=object)
+        
+        for step in range(self._color_steps):
+            progress = step / max(self._color_steps - 1, 1)
+            color = tuple(int(start + (end - start) * progress) for start, end in zip(self._start_color, self._end_color))
+            image = pygame.Surface((self._size, self._size))
+            image.fill(color)
+            self._images[step] = image
+        
 class SpriteCollider(Component):
     
     def initialize(self):
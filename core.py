@@ -1,15 +1,27 @@
 from typing import Type, TypeVar
 from abc import ABC, abstractmethod
+import time
+
+_import_time = time.time()
+
 from exceptions import *
 from util import *
 from components import * 
 from components_custom import *
 from pygame.locals import DOUBLEBUF
-import time
 import pygame
 import shutil
 import os
 import inspect
+import hashlib
+import pickle
+import heapq
+import bisect
+import array
+import itertools
+import ast
+import math
+import numpy as np
 
 class Game(ABC):
     
@@ -29,20 +41,66 @@ class Game(ABC):
         self._scenes = {}
         self._current_scene = None
         self._scene_builder = SceneBuilder()
+        self._event_handlers = {pygame.QUIT: self._quit}
+        self._input_recorder = None
+        self._input_replay = None
+        self._headless = False
+        self._parallel_workers = 0
+        self._parallel_min_batch_size = 0
+        self._time_to_first_frame = None
+        self._launch_time = _import_time
+    
+    def record_input(self, path):
+        self._input_recorder = InputRecorder(path)
     
-    def run(self):        
+    def replay_input(self, path, delta_time, headless = True, seed = 0):
+        Component.random_seed = seed
+        self._input_replay = InputReplay(path)
+        self._frame_metrics = FrameMetrics(delta_time)
+        self._headless = headless
+    
+    # Workers are started with forkserver, or spawn where forkserver is not available.
+    # Both re-import the game's __main__ module, so the script that calls run() must
+    # guard it with `if __name__ == "__main__":` or multiprocessing raises RuntimeError.
+    def enable_parallel_updates(self, workers, min_batch_size = 4096):
+        self._parallel_workers = workers
+        self._parallel_min_batch_size = min_batch_size
+    
+    # launch_time is a time.time() timestamp taken by the caller, ideally by the
+    # launcher when it starts the process. Without it, time-to-first-frame is
+    # measured from the import of core and leaves out interpreter start and
+    # everything imported before core, pygame included.
+    def run(self, launch_time = None):        
+        if launch_time is not None:
+            self._launch_time = launch_time
+        
         self._initialize()
         self._load_content(self._scene_builder, self._buffer)
-        self._scene_builder.save_scenes_as_files()
+        
+        scene_hash = self._scene_builder.get_scene_hash()
+        if not self._scene_manager.is_compiled(scene_hash):
+            self._scene_builder.save_scenes_as_files()
+            self._scene_manager.compile_scenes(scene_hash)
+        self._scene_builder.clear()
+        
         self._gameloop()
         self._unload_content()
     
     def _initialize(self):
+        if self._headless:
+            os.environ["SDL_VIDEODRIVER"] = "dummy"
+            os.environ["SDL_AUDIODRIVER"] = "dummy"
+        
         pygame.init()
         pygame.display.set_caption(self._title)
         self._window = pygame.display.set_mode((self._px_width, self._px_height), DOUBLEBUF)
+        pygame.event.set_blocked(None)
+        pygame.event.set_allowed(list(self._event_handlers) + self._input.get_event_types())
         self._buffer = Buffer(self._window)
         self._scene_manager = SceneManager(self._buffer)
+        
+        if self._parallel_workers > 0:
+            self._scene_manager.enable_parallel_updates(self._parallel_workers, self._parallel_min_batch_size)
 
     @abstractmethod
     def _load_content(self, scene_builder, buffer):
@@ -55,39 +113,71 @@ class Game(ABC):
         self._scene_manager.switch_scene(self._scene_builder.main_scene)
         
         while self._running:
-            self._input.copy_prev()
+            self._input.next_frame()
             self._handle_events()
             if not self._running: break
             self._update_scene()
             self._draw_scene()
             self._buffer.draw()
             pygame.display.flip()
+            if self._time_to_first_frame is None:
+                self._time_to_first_frame = time.time() - self._launch_time
+                log(f"First frame after (C){self._time_to_first_frame * 1000:.1f}ms(/)")
             self._frame_metrics.update()
-            pygame_clock.tick(self._frame_limit)
-            print(pygame_clock.get_fps())
+            if self._input_replay is None:
+                pygame_clock.tick(self._frame_limit)
+                print(pygame_clock.get_fps())
+        
+        if self._input_replay is not None:
+            self._log_frame_time_distribution()
         
     def _unload_content(self):
-        shutil.rmtree("tmp")
+        if self._input_recorder is not None:
+            self._input_recorder.close()
+        
+        self._scene_manager.stop_streaming()
+        self._scene_manager.stop_parallel_updates()
         
     def _handle_events(self):
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
+        if self._input_replay is not None:
+            if self._input_replay.is_finished():
                 self._running = False
-                pygame.quit()
-            elif event.type == pygame.KEYDOWN:
-                self._input.update_keydown(event.key)
-            elif event.type == pygame.KEYUP:
-                self._input.update_keyup(event.key)
-            elif event.type == pygame.MOUSEMOTION:
-                self._input.update_mouse_pos()
-            elif event.type == pygame.MOUSEBUTTONDOWN:
-                self._input.update_mouse_ptmpsed(event.button)
-            elif event.type == pygame.MOUSEBUTTONUP:
-                self._input.update_mouse_released(event.button)
-            elif event.type == pygame.MOUSEWHEEL:
-                self._input.update_mouse_wheel(event.y)
+                return
+            live_events = pygame.event.get()
+            events = self._input_replay.next_frame() + [event for event in live_events if event.type == pygame.QUIT]
+        else:
+            events = pygame.event.get()
+        
+        if self._input_recorder is not None:
+            self._input_recorder.record_frame(events)
+        
+        for event in events:
+            handler = self._event_handlers.get(event.type, self._input.handle_event)
+            handler(event)
+            if not self._running: break
+    
+    def _quit(self, event):
+        self._running = False
+        pygame.quit()
+    
+    def _log_frame_time_distribution(self):
+        distribution = self._frame_metrics.get_frame_time_distribution()
+        
+        if distribution is None:
+            return
+        
+        log(f"Replayed (C){distribution['frames']}(/) frames in (C){distribution['total']:.3f}s(/)")
+        log(
+            f"Frame time (P)mean(/) (C){distribution['mean'] * 1000:.3f}ms(/) "
+            f"(P)min(/) (C){distribution['min'] * 1000:.3f}ms(/) "
+            f"(P)p50(/) (C){distribution['p50'] * 1000:.3f}ms(/) "
+            f"(P)p95(/) (C){distribution['p95'] * 1000:.3f}ms(/) "
+            f"(P)p99(/) (C){distribution['p99'] * 1000:.3f}ms(/) "
+            f"(P)max(/) (C){distribution['max'] * 1000:.3f}ms(/)"
+        )
     
     def _update_scene(self):
+        self._scene_manager.update_streaming()
         self._scene_manager.get_current_scene().update_entities(self._scene_manager, self._frame_metrics, self._input, self._buffer._camera)
         self._scene_manager.get_current_scene().check_entities_for_deletion()
     
@@ -97,6 +187,9 @@ class Game(ABC):
     def get_window(self):
         return self._window
 
+    def get_time_to_first_frame(self):
+        return self._time_to_first_frame
+
     
 T = TypeVar("T", bound = Component)
 
@@ -112,8 +205,28 @@ class SceneBuilder:
         
         new_scene = Scene(name, is_main)
         self._scenes[name] = new_scene
+        
+        if is_main:
+            self.main_scene = name
+        
         return new_scene
 
+    def clear(self):
+        self._scenes = {}
+
+    def get_scene_hash(self):
+        writer = SceneHashWriter()
+        
+        with open(__file__, "rb") as file:
+            writer.update(file.read())
+        
+        for scene_name, scene in self._scenes.items():
+            writer.write(f"[scene]{scene_name}|{scene.camera.get_name()}|{scene._streaming}|{sorted(scene._persistent)}\n")
+            for entity_name, entity in scene._entities.items():
+                self._write_entity(writer, entity_name, entity)
+        
+        return writer.hexdigest()
+
     def save_scenes_as_files(self):
         if os.path.exists("tmp"):        
             shutil.rmtree("tmp")
@@ -127,42 +240,79 @@ class SceneBuilder:
                 file.write(f"{t}name={scene_name}\n")
                 
                 file.write(f"{t}camera={scene.camera.get_name()}\n")
+                file.write(f"{t}streaming={self._recursive_write_value('streaming', scene._streaming, t)}\n")
                 
-                if scene._is_main:
-                    self.main_scene = scene_name
-                
+                cells = {}
                 for entity_name, entity in scene._entities.items():
-                    file.write(f"{t}[entity]\n")
-                    t = "\t\t"
-                    file.write(f"{t}name={entity_name}\n")
-                    file.write(f"{t}is_active={entity.is_active}\n")
-                    file.write(f"{t}is_visible={entity.is_visible}\n")
-                    if entity._parent != None:
-                        parent = entity._parent._name
+                    cell = self._get_entity_cell(scene, entity)
+                    if cell is not None:
+                        cells.setdefault(cell, []).append((entity_name, entity))
                     else:
-                        parent = None
-                    file.write(f"{t}parent={parent}\n")
-                    
-                    for component_type, component in entity._components.items():
-                        t = "\t\t"
-                        file.write(f"{t}[component]\n")
-                        t = "\t\t\t"
-                        file.write(f"{t}type={component.__class__.__name__}\n")
-                        
-                        for attribute, value in component.__dict__.items():
-                            if attribute == "_entity" or attribute == "has_started": 
-                                continue
-                            file.write(f"{t}{attribute}={self._recursive_write_value(attribute, value, t)}\n")
-                        
-                        t = "\t\t"
-                        file.write(f"{t}[/component]\n")
-                    
-                    t = "\t"
-                    file.write(f"{t}[/entity]\n")
+                        self._write_entity(file, entity_name, entity)
                     
                 file.write("[/scene]")
+            
+            if cells:
+                os.makedirs(f"tmp/{scene_name}")
+            
+            for cell, entities in cells.items():
+                with open(f"tmp/{scene_name}/{cell[0]}_{cell[1]}.pyscn", "w") as file:
+                    file.write("[cell]\n")
+                    for entity_name, entity in entities:
+                        self._write_entity(file, entity_name, entity)
+                    file.write("[/cell]")
                         
         self._scenes = {}
+    
+    def _get_entity_cell(self, scene, entity):
+        if scene._streaming is None:
+            return None
+        
+        root = entity
+        while root.get_parent() is not None:
+            root = root.get_parent()
+        
+        camera_root = scene.camera
+        while camera_root.get_parent() is not None:
+            camera_root = camera_root.get_parent()
+        
+        if root is camera_root or root.get_name() in scene._persistent:
+            return None
+        
+        cell_size = scene._streaming[0]
+        position = root.transform.get_position()
+        return (int(position[0] // cell_size), int(position[1] // cell_size))
+    
+    def _write_entity(self, file, entity_name, entity):
+        t = "\t"
+        file.write(f"{t}[entity]\n")
+        t = "\t\t"
+        file.write(f"{t}name={entity_name}\n")
+        file.write(f"{t}is_active={entity.is_active}\n")
+        file.write(f"{t}is_visible={entity.is_visible}\n")
+        if entity._parent != None:
+            parent = entity._parent._name
+        else:
+            parent = None
+        file.write(f"{t}parent={parent}\n")
+        file.write(f"{t}tags={','.join(sorted(entity._tags))}\n")
+        
+        for component_type, component in entity._components.items():
+            t = "\t\t"
+            file.write(f"{t}[component]\n")
+            t = "\t\t\t"
+            file.write(f"{t}type={component.__class__.__name__}\n")
+            
+            for attribute, value in component.__dict__.items():
+                if attribute in ("_entity", "has_started", "_is_sleeping", "_wake_time", "_update_order"): 
+                    continue
+                file.write(f"{t}{attribute}={self._recursive_write_value(attribute, value, t)}\n")
+            
+            t = "\t\t"
+            file.write(f"{t}[/component]\n")
+        
+        t = "\t"
+        file.write(f"{t}[/entity]\n")
                         
     def _recursive_write_value(self, attribute, value, t):
         if isinstance(value, (str, int, float, bool)):
@@ -175,6 +325,8 @@ class SceneBuilder:
             return f"/{value.path}"
         elif isinstance(value, pygame.Rect):
             return value
+        elif isinstance(value, array.array):
+            return f"<{value.typecode}>" + ",".join(str(item) for item in value)
         elif isinstance(value, dict): 
             result = "{\n"
             t += "\t"
@@ -200,11 +352,27 @@ class SceneBuilder:
             result += t[:-1] + f"[/{object.__class__.__name__}]"
             return result
         
+class SceneHashWriter:
+    
+    def __init__(self):
+        self._hash = hashlib.sha256()
+    
+    def write(self, text):
+        self._hash.update(text.encode())
+    
+    def update(self, data):
+        self._hash.update(data)
+    
+    def hexdigest(self):
+        return self._hash.hexdigest()
+
 class SceneManager:
     
     def __init__(self, buffer):
         self._current_scene = None
         self._buffer = buffer
+        self._streamer = None
+        self._parallel_updater = None
     
     def get_current_scene(self):
         return self._current_scene
@@ -214,66 +382,164 @@ class SceneManager:
         
         log(f"Loading (P)Scene(/) (C){name}(/)")
         
-        with open(f"tmp/{name}.pyscn", "r") as file:
+        self.stop_streaming()
+        
+        if self._parallel_updater is not None:
+            self._parallel_updater.clear()
+        
+        data = self._read_compiled(f"tmp/{name}.pyscn", self._read_scene)
+        scene = Scene(data["name"], None)
+        scene._parallel_updater = self._parallel_updater
+        self._add_entities(scene, data["entities"])
+        
+        self._buffer._camera.main = scene._entities[data["camera"]]
+        
+        if data["streaming"] is not None:
+            scene.enable_streaming(*data["streaming"])
+            self._streamer = SceneStreamer(self, scene, self._buffer)
+        
+        log(f"Loaded (P)Scene(/) (C){scene.get_name()}(/) successfully")
+        self._current_scene = scene
+    
+    def enable_parallel_updates(self, workers, min_batch_size):
+        self._parallel_updater = ParallelUpdater(workers, min_batch_size)
+    
+    def stop_parallel_updates(self):
+        if self._parallel_updater is not None:
+            self._parallel_updater.close()
+            self._parallel_updater = None
+    
+    def update_streaming(self):
+        if self._streamer is not None:
+            self._streamer.update(self._buffer._camera.main.transform.get_position())
+    
+    def stop_streaming(self):
+        if self._streamer is not None:
+            self._streamer.stop()
+            self._streamer = None
+    
+    def is_compiled(self, scene_hash):
+        if not os.path.exists("tmp/scenes.hash"):
+            return False
+        
+        with open("tmp/scenes.hash", "r") as file:
+            return file.read() == scene_hash
+    
+    def compile_scenes(self, scene_hash):
+        for directory, directory_names, file_names in os.walk("tmp"):
+            for file_name in file_names:
+                if not file_name.endswith(".pyscn"):
+                    continue
+                
+                path = os.path.join(directory, file_name)
+                reader = self._read_scene if directory == "tmp" else self._read_cell
+                
+                with open(path + "c", "wb") as file:
+                    pickle.dump(reader(path), file, pickle.HIGHEST_PROTOCOL)
+        
+        with open("tmp/scenes.hash", "w") as file:
+            file.write(scene_hash)
+    
+    def _read_compiled(self, path, reader):
+        if os.path.exists(path + "c"):
+            with open(path + "c", "rb") as file:
+                return pickle.load(file)
+        
+        return reader(path)
+    
+    def _read_scene(self, path):
+        with open(path, "r") as file:
             file.readline()
+            name = file.readline().strip().split("=")[1]
+            camera = file.readline().strip().split("=")[1]
             line = file.readline().strip()
-            name = line.split("=")[1]
-            line = file.readline().strip()
-            camera = line.split("=")[1]
-            scene = Scene(name, None)
+            streaming = self._set_attr_value("streaming", line.split("=")[1], file)
             
-            entity = None
-            component = None
+            return {
+                "name": name,
+                "camera": camera,
+                "streaming": streaming,
+                "entities": self._read_entities(file, "[/scene]"),
+            }
+    
+    def _read_cell(self, path):
+        with open(path, "r") as file:
+            file.readline()
+            return self._read_entities(file, "[/cell]")
+    
+    def _read_entities(self, file, end_line):
+        entities = []
+        entity = None
+        component = None
+        
+        while True:
+            line = file.readline().strip()
+            if line == "[entity]":
+                entity = {
+                    "name": file.readline().strip().split("=")[1],
+                    "is_active": file.readline().strip().split("=")[1] == "True",
+                    "is_visible": file.readline().strip().split("=")[1] == "True",
+                    "parent": file.readline().strip().split("=")[1],
+                    "tags": [tag for tag in file.readline().strip().split("=")[1].split(",") if tag != ""],
+                    "components": [],
+                }
+                entities.append(entity)
             
-            while True:
-                line = file.readline().strip()
-                if line == "[entity]":
-                    name = file.readline().strip().split("=")[1]
-                    is_active = bool(file.readline().strip().split("=")[1])
-                    is_visible = bool(file.readline().strip().split("=")[1])
-                    parent = file.readline().strip().split("=")[1]
-                    
-                    if parent != "None":
-                        parent = scene.get_entity(parent)
-                    else:
-                        parent = None
-                    
-                    entity = scene.add_entity(name, parent)
-                    entity.is_active = is_active
-                    entity.is_visible = is_visible
-                
-                elif line == "[component]":
-                    type = file.readline().strip().split("=")[1]
-                    is_active = bool(file.readline().strip().split("=")[1])
-                
-                    if type == "Transform":
-                        component = entity.get_component(Transform)
-                    else:
-                        component = entity.add_component(globals()[type])
-                    
-                    component.is_active = is_active
+            elif line == "[component]":
+                component = {
+                    "type": file.readline().strip().split("=")[1],
+                    "is_active": file.readline().strip().split("=")[1] == "True",
+                    "attributes": {},
+                }
+                entity["components"].append(component)
 
-                elif line == "[/component]":         
-                    component = None
-                    
-                elif line == "[/scene]":
-                    break
-                
-                elif component != None:                    
-                    if line.count("=") > 0:
-                        attr = line.split("=")
-                    else:
-                        attr = line.split(":")
-                        
-                    key = attr[0]
-                    value = attr[1]
+            elif line == "[/component]":         
+                component = None
                 
-                    component.__dict__[key] = self._set_attr_value(key, value, file)        
+            elif line == end_line:
+                break
+            
+            elif component != None:                    
+                if line.count("=") > 0:
+                    attr = line.split("=")
+                else:
+                    attr = line.split(":")
+                    
+                key = attr[0]
+                value = attr[1]
+            
+                component["attributes"][key] = self._set_attr_value(key, value, file)
         
-        self._buffer._camera.main = scene._entities[camera]
+        return entities
+    
+    def _add_entities(self, scene, entities):
+        added = []
         
-        log(f"Loaded (P)Scene(/) (C){scene.get_name()}(/) successfully")
-        self._current_scene = scene
+        for data in entities:
+            if data["parent"] != "None":
+                parent = scene.get_entity(data["parent"])
+            else:
+                parent = None
+            
+            entity = scene.add_entity(data["name"], parent)
+            entity.is_active = data["is_active"]
+            entity.is_visible = data["is_visible"]
+            
+            for tag in data["tags"]:
+                entity.add_tag(tag)
+            
+            for component_data in data["components"]:
+                if component_data["type"] == "Transform":
+                    component = entity.get_component(Transform)
+                else:
+                    component = entity.add_component(ComponentRegistry.resolve(component_data["type"]))
+                
+                component.is_active = component_data["is_active"]
+                component.__dict__.update(component_data["attributes"])
+            
+            added.append(entity)
+        
+        return added
 
     def _set_attr_value(self, key, value, file):
         if value == "{":
@@ -299,6 +565,11 @@ class SceneManager:
                     break
                 list.append(self._set_attr_value(None, line, file))
             return list
+        elif value.startswith("<") and value[2:3] == ">":
+            typecode = value[1]
+            items = value[3:].split(",") if len(value) > 3 else []
+            item_type = float if typecode in ("f", "d") else int
+            return array.array(typecode, (item_type(item) for item in items))
         elif value.startswith("("):
             return eval(value)
         elif value.startswith("[") and value.endswith("]"):
@@ -315,12 +586,12 @@ class SceneManager:
                 key = attr[0]
                 value = attr[1]
                 class_attr[key] = self._set_attr_value(key, value, file)
-            return globals()[class_name](**class_attr)
+            return ComponentRegistry.resolve(class_name)(**class_attr)
         elif value.startswith("/"):
             return Path(value[1:])
-        elif value.isdigit():
+        elif value.lstrip("-").isdigit():
             return int(value)
-        elif value.replace(".", "", 1).isdigit() and value.count(".") <= 1:
+        elif value.lstrip("-").replace(".", "", 1).isdigit() and value.count(".") <= 1:
             return float(value)
         elif value == "True":
             return True
@@ -331,6 +602,311 @@ class SceneManager:
         else:
             return value
 
+class SceneStreamer:
+    
+    def __init__(self, scene_manager, scene, buffer):
+        self._scene_manager = scene_manager
+        self._scene = scene
+        self._buffer = buffer
+        self._cell_size, self._load_radius, self._unload_radius, self._max_loaded_entities = scene._streaming
+        self._directory = f"tmp/{scene.get_name()}"
+        self._available = set()
+        self._cells = {}
+        self._active_cells = set()
+        self._inactive_states = {}
+        self._pending = set()
+        self._loaded_entities = 0
+        import queue
+        import threading
+        
+        self._requests = queue.Queue()
+        self._results = queue.Queue()
+        
+        if os.path.exists(self._directory):
+            for file_name in os.listdir(self._directory):
+                if not file_name.endswith(".pyscn"):
+                    continue
+                cell_x, cell_y = file_name[:-len(".pyscn")].split("_")
+                self._available.add((int(cell_x), int(cell_y)))
+        
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+    
+    def update(self, position):
+        center = (int(position[0] // self._cell_size), int(position[1] // self._cell_size))
+        
+        for cell_y in range(center[1] - self._load_radius, center[1] + self._load_radius + 1):
+            for cell_x in range(center[0] - self._load_radius, center[0] + self._load_radius + 1):
+                cell = (cell_x, cell_y)
+                if cell in self._available and cell not in self._cells and cell not in self._pending:
+                    self._pending.add(cell)
+                    self._requests.put(cell)
+        
+        while not self._results.empty():
+            cell, entities = self._results.get_nowait()
+            
+            self._pending.discard(cell)
+            self._cells[cell] = self._scene_manager._add_entities(self._scene, entities)
+            self._active_cells.add(cell)
+            self._loaded_entities += len(self._cells[cell])
+            log(f"Streamed in (P)Cell(/) (C){cell}(/) of (P)Scene(/) (C){self._scene.get_name()}(/)")
+        
+        for cell in list(self._cells):
+            distance = self._get_distance(cell, center)
+            if distance <= self._load_radius:
+                self._activate(cell)
+            elif distance > self._unload_radius:
+                self._unload(cell)
+            else:
+                self._deactivate(cell)
+        
+        if self._loaded_entities > self._max_loaded_entities:
+            inactive_cells = sorted(
+                (cell for cell in self._cells if cell not in self._active_cells),
+                key=lambda cell: -self._get_distance(cell, center)
+            )
+            for cell in inactive_cells:
+                if self._loaded_entities <= self._max_loaded_entities:
+                    break
+                self._unload(cell)
+    
+    def stop(self):
+        self._requests.put(None)
+        self._thread.join()
+    
+    def _run(self):
+        while True:
+            cell = self._requests.get()
+            if cell is None:
+                break
+            
+            path = f"{self._directory}/{cell[0]}_{cell[1]}.pyscn"
+            entities = self._scene_manager._read_compiled(path, self._scene_manager._read_cell)
+            
+            self._results.put((cell, entities))
+    
+    def _get_distance(self, cell, center):
+        return max(abs(cell[0] - center[0]), abs(cell[1] - center[1]))
+    
+    def _activate(self, cell):
+        if cell in self._active_cells:
+            return
+        
+        for entity, (is_active, components) in self._inactive_states.pop(cell).items():
+            entity.is_active = is_active
+            self._scene._resume_components(components)
+        self._active_cells.add(cell)
+    
+    def _deactivate(self, cell):
+        if cell not in self._active_cells:
+            return
+        
+        states = {}
+        for entity in self._cells[cell]:
+            states[entity] = (entity.is_active, self._scene._suspend_components(entity))
+            entity.is_active = False
+            self._buffer.remove_entity(entity)
+        self._inactive_states[cell] = states
+        self._active_cells.discard(cell)
+    
+    def _unload(self, cell):
+        entities = self._cells.pop(cell)
+        self._active_cells.discard(cell)
+        self._inactive_states.pop(cell, None)
+        self._loaded_entities -= len(entities)
+        
+        for entity in entities:
+            if self._scene.get_entity(entity.get_name()) is entity:
+                self._buffer.remove_entity(entity)
+                entity.delete()
+        
+        log(f"Streamed out (P)Cell(/) (C){cell}(/) of (P)Scene(/) (C){self._scene.get_name()}(/)")
+
+class ParallelComponentStore:
+    
+    def __init__(self, component_type, capacity):
+        self._component_type = component_type
+        self._fields = component_type.fields
+        self._capacity = 0
+        self._count = 0
+        self._components = []
+        self._memory = {}
+        self._arrays = {}
+        self._resize(capacity)
+    
+    def add(self, component):
+        if self._count == self._capacity:
+            self._resize(self._capacity * 2)
+        
+        index = self._count
+        for name in self._fields:
+            self._arrays[name][index] = component.__dict__["_" + name]
+        
+        self._components.append(component)
+        component._store = self
+        component._store_index = index
+        self._count += 1
+    
+    def remove(self, component):
+        index = component._store_index
+        last = self._count - 1
+        
+        for name in self._fields:
+            component.__dict__["_" + name] = self.get_value(name, index)
+        
+        if index != last:
+            moved = self._components[last]
+            for array in self._arrays.values():
+                array[index] = array[last]
+            self._components[index] = moved
+            moved._store_index = index
+        
+        self._components.pop()
+        component._store = None
+        component._store_index = None
+        self._count -= 1
+    
+    def get_count(self):
+        return self._count
+    
+    def get_component_type(self):
+        return self._component_type
+    
+    def get_arrays(self, start, end):
+        return {name: array[start:end] for name, array in self._arrays.items()}
+    
+    def get_descriptors(self):
+        return {name: (memory.name, self._arrays[name].shape) for name, memory in self._memory.items()}
+    
+    def get_value(self, name, index):
+        value = self._arrays[name][index]
+        return tuple(value.tolist()) if self._fields[name] > 1 else float(value)
+    
+    def set_value(self, name, index, value):
+        self._arrays[name][index] = value
+    
+    def close(self):
+        for component in list(self._components):
+            self.remove(component)
+        
+        self._arrays = {}
+        for memory in self._memory.values():
+            memory.close()
+            memory.unlink()
+        self._memory = {}
+        _next_memory_generation()
+    
+    def _resize(self, capacity):
+        from multiprocessing import shared_memory
+        
+        memory = {}
+        arrays = {}
+        
+        for name, size in self._fields.items():
+            shape = (capacity, size) if size > 1 else (capacity,)
+            memory[name] = shared_memory.SharedMemory(create=True, size=max(capacity * size * 8, 1))
+            arrays[name] = np.ndarray(shape, dtype=np.float64, buffer=memory[name].buf)
+            
+            if name in self._arrays:
+                arrays[name][:self._count] = self._arrays[name][:self._count]
+        
+        self._arrays = {}
+        for old_memory in self._memory.values():
+            old_memory.close()
+            old_memory.unlink()
+        
+        self._memory = memory
+        self._arrays = arrays
+        self._capacity = capacity
+        _next_memory_generation()
+
+_memory_generation = 0
+_attached_memory = {}
+_attached_generation = None
+
+def _next_memory_generation():
+    global _memory_generation
+    _memory_generation += 1
+
+def _update_parallel_batch(component_type, descriptors, generation, start, end, delta_time):
+    global _attached_generation
+    from multiprocessing import shared_memory
+    
+    if generation != _attached_generation:
+        for memory in _attached_memory.values():
+            memory.close()
+        _attached_memory.clear()
+        _attached_generation = generation
+    
+    arrays = {}
+    
+    for name, (memory_name, shape) in descriptors.items():
+        memory = _attached_memory.get(memory_name)
+        if memory is None:
+            memory = shared_memory.SharedMemory(name=memory_name)
+            _attached_memory[memory_name] = memory
+        arrays[name] = np.ndarray(shape, dtype=np.float64, buffer=memory.buf)[start:end]
+    
+    component_type.update_batch(arrays, delta_time)
+
+class ParallelUpdater:
+    
+    def __init__(self, workers, min_batch_size):
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+        
+        self._workers = workers
+        self._min_batch_size = min_batch_size
+        start_method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+        self._executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context(start_method))
+        self._stores = {}
+    
+    def register(self, component):
+        if component._store is not None:
+            return
+        
+        store = self._stores.get(type(component))
+        if store is None:
+            store = ParallelComponentStore(type(component), max(self._min_batch_size, 64))
+            self._stores[type(component)] = store
+        
+        store.add(component)
+    
+    def unregister(self, component):
+        if component._store is not None:
+            component._store.remove(component)
+    
+    def update(self, delta_time):
+        futures = []
+        
+        for store in self._stores.values():
+            count = store.get_count()
+            if count == 0:
+                continue
+            
+            if count <= self._min_batch_size:
+                store.get_component_type().update_batch(store.get_arrays(0, count), delta_time)
+                continue
+            
+            batch_size = max(math.ceil(count / self._workers), self._min_batch_size)
+            
+            descriptors = store.get_descriptors()
+            for start in range(0, count, batch_size):
+                end = min(start + batch_size, count)
+                futures.append(self._executor.submit(_update_parallel_batch, store.get_component_type(), descriptors, _memory_generation, start, end, delta_time))
+        
+        for future in futures:
+            future.result()
+    
+    def clear(self):
+        for store in self._stores.values():
+            store.close()
+        self._stores = {}
+    
+    def close(self):
+        self.clear()
+        self._executor.shutdown()
+
 class Scene:
     
     def __init__(self, name, is_main):
@@ -339,6 +915,18 @@ class Scene:
         self._is_main = is_main
         self._to_be_deleted = []
         self.camera = ""
+        self._awake_components = []
+        self._awake_orders = []
+        self._sleeping_components = []
+        self._sleep_counter = itertools.count()
+        self._entity_counter = itertools.count()
+        self._component_counter = itertools.count()
+        self._time = 0
+        self._component_index = {}
+        self._tag_index = {}
+        self._streaming = None
+        self._persistent = set()
+        self._parallel_updater = None
     
     def get_name(self):
         return self._name
@@ -348,9 +936,11 @@ class Scene:
             raise DuplicateEntityException()
         
         new_entity = Entity(name, self, parent) 
+        new_entity._order = next(self._entity_counter)
         self._entities[name] = new_entity
         
         if parent is not None:
+            parent._children[name] = new_entity
             log("Added new (P)Entity(/) (C)" + name + "(/) to (P)Scene(/) (C)" + self._name + "(/) as child of (P)Entity(/) (C)" + parent.get_name() + "(/)")
         else:
             log("Added new (P)Entity(/) (C)" + name + "(/) to (P)Scene(/) (C)" + self._name + "(/)")      
@@ -366,10 +956,107 @@ class Scene:
         else:
             return None
 
+    def enable_streaming(self, cell_size, load_radius, unload_radius, max_loaded_entities):
+        self._streaming = (cell_size, load_radius, unload_radius, max_loaded_entities)
+    
+    def keep_loaded(self, entity):
+        self._persistent.add(entity.get_name())
+    
+    def get_components(self, component: Type[T]):
+        return iter(list(self._component_index.get(component, {}).values()))
+    
+    def get_entities_with_component(self, component: Type[T]):
+        return iter([instance.get_entity() for instance in self._component_index.get(component, {}).values()])
+    
+    def get_entities_with_tag(self, tag):
+        return iter(list(self._tag_index.get(tag, {}).values()))
+
     def update_entities(self, scene_manager, frame_metrics, input, camera):
-        for entity_name, entity in self._entities.items():
-            if entity.is_hierarchy_active():
-                entity.update_components(scene_manager, frame_metrics, input, camera)
+        self._time += frame_metrics.get_delta_time()
+        self._wake_due_components()
+        
+        updater = self._parallel_updater
+        
+        for component in list(self._awake_components):
+            if component._is_sleeping or not component.is_active or not component._entity.is_hierarchy_active():
+                if component.is_parallel and updater is not None:
+                    updater.unregister(component)
+                continue
+            if not component.has_started:
+                component.start()
+                component.has_started = True
+                if type(component).update is Component.update:
+                    self._sleep_component(component, None)
+                    continue
+            if component.is_parallel and updater is not None:
+                updater.register(component)
+                continue
+            component.update(scene_manager, frame_metrics, input, camera)
+        
+        if updater is not None:
+            updater.update(frame_metrics.get_delta_time())
+
+    def _sleep_component(self, component, seconds):
+        self._remove_awake_component(component)
+        
+        if component.is_parallel and self._parallel_updater is not None:
+            self._parallel_updater.unregister(component)
+        
+        component._is_sleeping = True
+        component._wake_time = None
+        
+        if seconds is not None:
+            component._wake_time = self._time + seconds
+            heapq.heappush(self._sleeping_components, (component._wake_time, next(self._sleep_counter), component))
+    
+    def _wake_component(self, component):
+        if not component._is_sleeping:
+            return
+        
+        component._is_sleeping = False
+        component._wake_time = None
+        self._add_awake_component(component)
+    
+    def _add_awake_component(self, component):
+        index = bisect.bisect_left(self._awake_orders, component._update_order)
+        
+        if index < len(self._awake_orders) and self._awake_components[index] is component:
+            return
+        
+        self._awake_orders.insert(index, component._update_order)
+        self._awake_components.insert(index, component)
+    
+    def _remove_awake_component(self, component):
+        index = bisect.bisect_left(self._awake_orders, component._update_order)
+        
+        if index < len(self._awake_orders) and self._awake_components[index] is component:
+            del self._awake_orders[index]
+            del self._awake_components[index]
+            return True
+        
+        return False
+    
+    def _suspend_components(self, entity):
+        suspended = []
+        
+        for component in entity._components.values():
+            if self._remove_awake_component(component):
+                if component.is_parallel and self._parallel_updater is not None:
+                    self._parallel_updater.unregister(component)
+                suspended.append(component)
+        
+        return suspended
+    
+    def _resume_components(self, components):
+        for component in components:
+            if component._entity._name in self._entities and not component._is_sleeping:
+                self._add_awake_component(component)
+    
+    def _wake_due_components(self):
+        while self._sleeping_components and self._sleeping_components[0][0] <= self._time:
+            wake_time, counter, component = heapq.heappop(self._sleeping_components)
+            if component._is_sleeping and component._wake_time == wake_time:
+                self._wake_component(component)
     
     def draw_entities(self, buffer):
         for entity_name, entity in self._entities.items():
@@ -378,7 +1065,15 @@ class Scene:
 
     def check_entities_for_deletion(self):
         for key in self._to_be_deleted:
-            self._entities.pop(key)
+            entity = self._entities.pop(key, None)
+            if entity is None:
+                continue
+            for component in entity._components.values():
+                self._remove_awake_component(component)
+                component._is_sleeping = False
+                component._wake_time = None
+                if component.is_parallel and self._parallel_updater is not None:
+                    self._parallel_updater.unregister(component)
         
         self._to_be_deleted = []
         
@@ -392,12 +1087,21 @@ class Entity:
         self._parent = parent
         self._children = {}
         self._components = {}
+        self._tags = set()
+        self._order = 0
 
     def delete(self):
         for type, component in self._components.items():
             component.is_active = False
+            self._scene._component_index[type].pop(self._name, None)
             del component
         
+        for tag in self._tags:
+            self._scene._tag_index[tag].pop(self._name, None)
+        
+        if self._parent is not None:
+            self._parent._children.pop(self._name, None)
+        
         self._scene._to_be_deleted.append(self._name)
         self.is_active = False
         del self
@@ -425,21 +1129,38 @@ class Entity:
         return self._parent
 
     def get_child(self, name):
-        child = self._children.get(name)
-        if child is not None and child in self._children:
-                return child
-        return None
+        return self._children.get(name, None)
     
     def get_children(self):
         return self._children
 
+    def add_tag(self, tag):
+        self._tags.add(tag)
+        self._scene._tag_index.setdefault(tag, {})[self._name] = self
+    
+    def remove_tag(self, tag):
+        if tag in self._tags:
+            self._tags.discard(tag)
+            self._scene._tag_index[tag].pop(self._name, None)
+    
+    def has_tag(self, tag):
+        return tag in self._tags
+    
+    def get_tags(self):
+        return self._tags
+
     def add_component(self, component: Type[T]) -> T:
         if self.get_component(component) is not None:
             raise DuplicateComponentException()
 
         new_component = component(self)
+        new_component._update_order = (self._order, next(self._scene._component_counter))
         new_component.initialize()
         self._components[component] = (new_component)
+        self._scene._component_index.setdefault(component, {})[self._name] = new_component
+        
+        if not new_component._is_sleeping:
+            self._scene._add_awake_component(new_component)
         
         log("Added (P)Component(/) of type (C)" + new_component.__class__.__name__ + "(/) to (P)Entity(/) (C)" + self._name + "(/)")
         
@@ -454,14 +1175,6 @@ class Entity:
         else:
             return True
 
-    def update_components(self, scene_manager, frame_metrics, input, camera):
-        for type, component in self._components.items():
-            if component.is_active:
-                if not component.has_started:
-                    component.start()
-                    component.has_started = True
-                component.update(scene_manager, frame_metrics, input, camera)
-
     def draw_components(self, buffer):
         for type, component in self._components.items():
             if component.is_active:   
@@ -474,12 +1187,16 @@ class Buffer:
         self._window_size = self._window.get_size()
         self._buffer_surface = pygame.Surface(self._window_size)
         self._layers = {}
+        self._tilemaps = {}
+        self._particle_emitters = {}
         self._collider_group = {}
         self._camera = Camera()
     
     def add_layer(self, layer):
         if layer not in self._layers:
             self._layers[layer] = []
+            self._tilemaps[layer] = []
+            self._particle_emitters[layer] = []
             self._collider_group[layer] = set()
     
     def add_to_group(self, sprite_renderer):
@@ -502,9 +1219,53 @@ class Buffer:
         for data in self._layers[layer]:
             if data.key == key:
                 self._layers[layer].remove(data)
-                self._collider_group[layer].discard(data.collider)
+                self._collider_group[layer].discard(data)
                 break
 
+    def remove_entity(self, entity):
+        sprite_renderer = entity.get_component(SpriteRenderer)
+        if sprite_renderer is not None and sprite_renderer._added_to_group:
+            self.remove_from_group(sprite_renderer)
+            sprite_renderer._added_to_group = False
+        
+        tilemap = entity.get_component(Tilemap)
+        if tilemap is not None and tilemap._added_to_buffer:
+            self.remove_tilemap(tilemap)
+            tilemap._added_to_buffer = False
+        
+        particle_emitter = entity.get_component(ParticleEmitter)
+        if particle_emitter is not None and particle_emitter._added_to_buffer:
+            self.remove_particle_emitter(particle_emitter)
+            particle_emitter._added_to_buffer = False
+
+    def add_tilemap(self, tilemap):
+        layer = tilemap.get_layer()
+        
+        if layer not in self._layers:
+            raise UnknownBufferLayerException()
+        
+        self._tilemaps[layer].append(tilemap)
+    
+    def remove_tilemap(self, tilemap):
+        layer = tilemap.get_layer()
+        
+        if tilemap in self._tilemaps[layer]:
+            self._tilemaps[layer].remove(tilemap)
+
+    def add_particle_emitter(self, particle_emitter):
+        layer = particle_emitter.get_layer()
+        
+        if layer not in self._layers:
+            raise UnknownBufferLayerException()
+        
+        self._particle_emitters[layer].append(particle_emitter)
+    
+    def remove_particle_emitter(self, particle_emitter):
+        layer = particle_emitter.get_layer()
+        
+        if particle_emitter in self._particle_emitters[layer]:
+            self._particle_emitters[layer].remove(particle_emitter)
+
     def draw(self):        
         self._buffer_surface.fill((255, 0, 255))
     
@@ -513,6 +1274,13 @@ class Buffer:
         rects = {layer: [data.sprite.image.get_rect() for data in data_list] for layer, data_list in self._layers.items()}
 
         for layer, data_list in self._layers.items():
+            for tilemap in self._tilemaps[layer]:
+                if tilemap.get_entity().is_active:
+                    self._buffer_surface.blits(
+                        [(surface, (position[0] - camera_position[0], position[1] - camera_position[1])) for surface, position in tilemap.get_visible_chunks(camera_position, self._window_size)],
+                        doreturn=False
+                    )
+            
             data_list = sorted(data_list, key=lambda data: -data.transform.get_position()[1])
                         
             for i, buffer_data in enumerate(data_list):
@@ -525,6 +1293,9 @@ class Buffer:
                     
                     self._buffer_surface.blit(buffer_data.sprite.image, blit_position)
             
+            for particle_emitter in self._particle_emitters[layer]:
+                if particle_emitter.get_entity().is_active:
+                    self._buffer_surface.blits(particle_emitter.get_blits(camera_position), doreturn=False)
             
             self._window.blit(self._buffer_surface, (0, 0))
                             
@@ -546,44 +1317,82 @@ class BufferData:
 class Input:
     
     def __init__(self):
+        self._frame = 0
         self._key_states = {}
-        self._prev_key_states = {}
         self._mouse_pos = (0, 0)
         self._mouse_wheel = 0
         self._mouse_states = {}
-        self._prev_mouse_states = {}
+        self._subscribers = {}
+        self._handlers = {
+            pygame.KEYDOWN: self._on_keydown,
+            pygame.KEYUP: self._on_keyup,
+            pygame.MOUSEMOTION: self._on_mouse_motion,
+            pygame.MOUSEBUTTONDOWN: self._on_mouse_pressed,
+            pygame.MOUSEBUTTONUP: self._on_mouse_released,
+            pygame.MOUSEWHEEL: self._on_mouse_wheel,
+        }
 
-    def copy_prev(self):
+    def next_frame(self):
+        self._frame += 1
         self._mouse_wheel = 0
-        self._prev_key_states = self._key_states.copy()
-        self._prev_mouse_states = self._mouse_states.copy()
 
-    def update_keydown(self, key):
-        self._key_states[key] = True
+    def handle_event(self, event):
+        handler = self._handlers.get(event.type)
+        if handler is not None:
+            handler(event)
+        
+        subscribers = self._subscribers.get(event.type)
+        if subscribers:
+            for callback in list(subscribers):
+                callback(event)
+
+    def subscribe(self, event_type, callback):
+        self._subscribers.setdefault(event_type, []).append(callback)
+        
+        if pygame.get_init():
+            pygame.event.set_allowed(event_type)
+
+    def unsubscribe(self, event_type, callback):
+        subscribers = self._subscribers.get(event_type)
+        
+        if subscribers is not None and callback in subscribers:
+            subscribers.remove(callback)
+
+    def get_event_types(self):
+        return list(self._handlers) + [event_type for event_type in self._subscribers if event_type not in self._handlers]
 
-    def update_keyup(self, key):
-        self._key_states[key] = False
+    def _on_keydown(self, event):
+        if not self.is_key_pressed(event.key):
+            self._key_states[event.key] = (True, self._frame)
 
-    def update_mouse_pos(self):
-        self._mouse_pos = pygame.mouse.get_pos()
+    def _on_keyup(self, event):
+        if self.is_key_pressed(event.key):
+            self._key_states[event.key] = (False, self._frame)
 
-    def update_mouse_ptmpsed(self, button):
-        self._mouse_states[button] = True
+    def _on_mouse_motion(self, event):
+        self._mouse_pos = event.pos
+
+    def _on_mouse_pressed(self, event):
+        if not self.is_mouse_pressed(event.button):
+            self._mouse_states[event.button] = (True, self._frame)
     
-    def update_mouse_released(self, button):
-        self._mouse_states[button] = False
+    def _on_mouse_released(self, event):
+        if self.is_mouse_pressed(event.button):
+            self._mouse_states[event.button] = (False, self._frame)
 
-    def update_mouse_wheel(self, direction):
-        self._mouse_wheel = direction
+    def _on_mouse_wheel(self, event):
+        self._mouse_wheel = event.y
         
     def is_key_pressed(self, key):
-        return self._key_states.get(key, False)
+        return self._key_states.get(key, (False, 0))[0]
 
     def is_key_just_pressed(self, key):
-        return self._key_states.get(key, False) and not self._prev_key_states.get(key, False)
+        pressed, frame = self._key_states.get(key, (False, -1))
+        return pressed and frame == self._frame
 
     def is_key_just_released(self, key): 
-        return not self._key_states.get(key, False) and self._prev_key_states.get(key, False)
+        pressed, frame = self._key_states.get(key, (True, -1))
+        return not pressed and frame == self._frame
 
     def get_mouse_pos(self):
         return self._mouse_pos
@@ -592,32 +1401,94 @@ class Input:
         return self._mouse_wheel
     
     def is_mouse_pressed(self, button):
-        return self._mouse_states.get(button, False)
+        return self._mouse_states.get(button, (False, 0))[0]
 
     def is_mouse_just_pressed(self, button):
-        return self._mouse_states.get(button, False) and not self._prev_mouse_states.get(button, False)
+        pressed, frame = self._mouse_states.get(button, (False, -1))
+        return pressed and frame == self._frame
     
     def is_mouse_just_released(self, button):
-        return not self._mouse_states.get(button, False) and self._prev_mouse_states.get(button, False)
+        pressed, frame = self._mouse_states.get(button, (True, -1))
+        return not pressed and frame == self._frame
     
 class FrameMetrics:
     
-    def __init__(self):
+    def __init__(self, fixed_delta_time = None):
         self._start_time = None
         self._end_time = 0
         self._delta_time = 0
+        self._fixed_delta_time = fixed_delta_time
+        self._frame_times = []
     
     def start(self):
-        self._start_time = time.time()
+        self._start_time = time.perf_counter()
     
     def update(self):
-        self._end_time = time.time()
-        self._delta_time = self._end_time - self._start_time
-        self._start_time = time.time()
+        self._end_time = time.perf_counter()
+        
+        if self._fixed_delta_time is not None:
+            self._frame_times.append(self._end_time - self._start_time)
+            self._delta_time = self._fixed_delta_time
+        else:
+            self._delta_time = self._end_time - self._start_time
+        
+        self._start_time = time.perf_counter()
         
     def get_delta_time(self):
         return self._delta_time
     
+    def get_frame_time_distribution(self):
+        if not self._frame_times:
+            return None
+        
+        frame_times = sorted(self._frame_times)
+        count = len(frame_times)
+        total = sum(frame_times)
+        
+        return {
+            "frames": count,
+            "total": total,
+            "mean": total / count,
+            "min": frame_times[0],
+            "p50": frame_times[min(int(count * 0.5), count - 1)],
+            "p95": frame_times[min(int(count * 0.95), count - 1)],
+            "p99": frame_times[min(int(count * 0.99), count - 1)],
+            "max": frame_times[-1],
+        }
+    
+class InputRecorder:
+    
+    def __init__(self, path):
+        self._path = path
+        self._file = None
+    
+    def record_frame(self, events):
+        if self._file is None:
+            self._file = open(self._path, "w")
+        
+        frame = [(event.type, {key: value for key, value in event.dict.items() if isinstance(value, (str, int, float, bool, tuple, type(None)))}) for event in events]
+        self._file.write(repr(frame) + "\n")
+    
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+class InputReplay:
+    
+    def __init__(self, path):
+        with open(path, "r") as file:
+            self._frames = [ast.literal_eval(line) for line in file]
+        self._index = 0
+    
+    def is_finished(self):
+        return self._index >= len(self._frames)
+    
+    def next_frame(self):
+        frame = self._frames[self._index]
+        self._index += 1
+        return [pygame.event.Event(event_type, attributes) for event_type, attributes in frame]
+    
 class Camera:
     
     def __init__(self):
@@ -26,4 +26,13 @@ class DuplicateKeyException(Exception):
     pass
 
 class KeyNotFoundException(Exception):
-    pass
\ No newline at end of file
+    pass
+
+class TileOutOfBoundsException(Exception):
+    pass
+
+class UnknownComponentException(Exception):
+    pass
+
+class UnknownTileException(Exception):
+    pass
@@ -1,5 +1,7 @@
 import pygame
+import importlib
 from pygame.sprite import Sprite
+from exceptions import UnknownComponentException
 
 class Color:
     WHITE = (255, 255, 255)
@@ -20,6 +22,36 @@ class Path:
     def __init__(self, path):
         self.path = path
         
+class ComponentRegistry:
+    
+    modules = ["components", "util", "components_custom"]
+    _types = {}
+    
+    @classmethod
+    def register(cls, type):
+        cls._types[type.__name__] = type
+    
+    @classmethod
+    def resolve(cls, name):
+        type = cls._types.get(name)
+        if type is not None:
+            return type
+        
+        for module_name in cls.modules:
+            try:
+                module = importlib.import_module(module_name)
+            except ModuleNotFoundError as error:
+                if error.name != module_name:
+                    raise
+                continue
+            
+            type = getattr(module, name, None)
+            if type is not None:
+                cls._types[name] = type
+                return type
+        
+        raise UnknownComponentException(name)
+        
 def log(msg):
     msg = msg.replace("(/)", T_Color.RESET)
     msg = msg.replace("(C)", T_Color.CYAN)